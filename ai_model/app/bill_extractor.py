@@ -1,6 +1,10 @@
+import io
 import os
 import re
+import cv2
+import pypdfium2 as pdfium
 from google.api_core.client_options import ClientOptions
+from google.auth.credentials import AnonymousCredentials
 from google.cloud import documentai
 from typing import Optional, Tuple
 from dotenv import load_dotenv
@@ -11,6 +15,16 @@ load_dotenv()
 PROJECT_ID = os.environ.get("GCP_PROJECT_ID")
 LOCATION = os.environ.get("DOC_AI_LOCATION", "us")
 PROCESSOR_ID = os.environ.get("DOC_AI_OCR_PROCESSOR_ID")
+# Optional REST endpoint override, e.g. "http://127.0.0.1:9003" for a local stand-in
+DOC_AI_API_ENDPOINT = os.environ.get("DOC_AI_API_ENDPOINT")
+
+# Pages sent on the first OCR pass; the rest are only sent if no address is found
+OCR_INITIAL_PAGES = int(os.environ.get("OCR_INITIAL_PAGES", 1))
+# Rasterise PDF pages at this DPI before upload (0 keeps the original PDF pages)
+OCR_RASTER_DPI = int(os.environ.get("OCR_RASTER_DPI", 0))
+# Images larger than this on their longest side are downscaled and re-compressed
+OCR_IMAGE_MAX_SIDE = int(os.environ.get("OCR_IMAGE_MAX_SIDE", 2000))
+OCR_JPEG_QUALITY = int(os.environ.get("OCR_JPEG_QUALITY", 85))
 
 # --- Helper Function to Extract Address from Raw Text ---
 
@@ -100,10 +114,75 @@ def get_mime_type_from_path(file_path: str) -> str:
     return "application/pdf"
 
 
+def prepare_pdf_pages(file_path: str, start: int, end: Optional[int]) -> Tuple[bytes, str, int]:
+    """
+    Builds the upload for pages [start, end) of a PDF: either a smaller PDF
+    holding just those pages, or a multi-page TIFF rendered at OCR_RASTER_DPI.
+    Returns (content, mime_type, total_pages).
+    """
+    pdf = pdfium.PdfDocument(file_path)
+    try:
+        total = len(pdf)
+        end = total if end is None else min(end, total)
+        page_indices = list(range(start, end))
+        buffer = io.BytesIO()
+
+        if OCR_RASTER_DPI:
+            images = [
+                pdf[i].render(scale=OCR_RASTER_DPI / 72).to_pil().convert("RGB")
+                for i in page_indices
+            ]
+            images[0].save(
+                buffer,
+                format="TIFF",
+                save_all=True,
+                append_images=images[1:],
+                compression="jpeg",
+                dpi=(OCR_RASTER_DPI, OCR_RASTER_DPI),
+            )
+            return buffer.getvalue(), "image/tiff", total
+
+        if start == 0 and end == total:
+            with open(file_path, "rb") as f:
+                return f.read(), "application/pdf", total
+
+        subset = pdfium.PdfDocument.new()
+        subset.import_pages(pdf, page_indices)
+        subset.save(buffer)
+        subset.close()
+        return buffer.getvalue(), "application/pdf", total
+    finally:
+        pdf.close()
+
+
+def prepare_image(file_path: str, mime_type: str) -> Tuple[bytes, str]:
+    """Downscales and re-compresses oversized photos of bills."""
+    image = cv2.imread(file_path, cv2.IMREAD_COLOR)
+    if image is not None:
+        h, w = image.shape[:2]
+        if max(h, w) > OCR_IMAGE_MAX_SIDE:
+            scale = OCR_IMAGE_MAX_SIDE / max(h, w)
+            image = cv2.resize(
+                image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA
+            )
+            ok, encoded = cv2.imencode(
+                ".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, OCR_JPEG_QUALITY]
+            )
+            if ok:
+                return encoded.tobytes(), "image/jpeg"
+
+    with open(file_path, "rb") as f:
+        return f.read(), mime_type
+
+
 def extract_address_from_pdf(file_path: str) -> str:
     """
     Processes a document using the Document AI OCR Processor to get the full text,
     and then extracts a likely address using regex.
+
+    Only the first OCR_INITIAL_PAGES pages of a PDF are sent at first; the
+    remaining pages are OCR'd (and their text appended) only when no address
+    is found in them.
     """
     if not all([PROJECT_ID, PROCESSOR_ID]):
         print("Configuration Error: GCP_PROJECT_ID or DOC_AI_OCR_PROCESSOR_ID not set.")
@@ -113,27 +192,58 @@ def extract_address_from_pdf(file_path: str) -> str:
 
     try:
         # 1. Document AI: OCR Processing
-        opts = ClientOptions(api_endpoint=f"{LOCATION}-documentai.googleapis.com")
-        documentai_client = documentai.DocumentProcessorServiceClient()
+        if DOC_AI_API_ENDPOINT:
+            documentai_client = documentai.DocumentProcessorServiceClient(
+                client_options=ClientOptions(api_endpoint=DOC_AI_API_ENDPOINT),
+                credentials=AnonymousCredentials(),
+                transport="rest",
+            )
+        else:
+            opts = ClientOptions(api_endpoint=f"{LOCATION}-documentai.googleapis.com")
+            documentai_client = documentai.DocumentProcessorServiceClient(
+                client_options=opts
+            )
         resource_name = documentai_client.processor_path(
             PROJECT_ID, LOCATION, PROCESSOR_ID
         )
 
-        with open(file_path, "rb") as image:
-            image_content = image.read()
-
-        raw_document = documentai.RawDocument(
-            content=image_content, mime_type=mime_type
-        )
-        request = documentai.ProcessRequest(
-            name=resource_name, raw_document=raw_document
-        )
-
-        result = documentai_client.process_document(request=request)
-        full_text = result.document.text
+        def ocr(content: bytes, content_mime_type: str) -> str:
+            raw_document = documentai.RawDocument(
+                content=content, mime_type=content_mime_type
+            )
+            request = documentai.ProcessRequest(
+                name=resource_name, raw_document=raw_document
+            )
+            result = documentai_client.process_document(request=request)
+            return result.document.text
+
+        if mime_type != "application/pdf":
+            full_text = ocr(*prepare_image(file_path, mime_type))
+            return extract_address_from_text(full_text)
+
+        try:
+            content, page_mime_type, total_pages = prepare_pdf_pages(
+                file_path, 0, OCR_INITIAL_PAGES
+            )
+        except pdfium.PdfiumError as e:
+            # Not a PDF pdfium can read; send the file untouched as before
+            print(f"PDF preprocessing skipped: {e}")
+            with open(file_path, "rb") as f:
+                return extract_address_from_text(ocr(f.read(), mime_type))
 
         # 2. Address Extraction: Apply heuristic regex on the extracted text
-        return extract_address_from_text(full_text)
+        full_text = ocr(content, page_mime_type)
+        address = extract_address_from_text(full_text)
+
+        if address.startswith("Extraction failed") and total_pages > OCR_INITIAL_PAGES:
+            print(f"No address on first {OCR_INITIAL_PAGES} page(s), widening OCR")
+            content, page_mime_type, _ = prepare_pdf_pages(
+                file_path, OCR_INITIAL_PAGES, None
+            )
+            full_text = full_text + "\n" + ocr(content, page_mime_type)
+            address = extract_address_from_text(full_text)
+
+        return address
 
     except Exception as e:
         print(f"An error occurred during document processing: {e}")
@@ -11,10 +11,50 @@ S3_REGION = os.getenv("S3_REGION", "")
 S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME", "")
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID", "")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY", "")
+# Optional S3-compatible endpoint (e.g. a local stand-in for load tests)
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
 
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY", "")
+GOOGLE_MAPS_API_URL = os.getenv(
+    "GOOGLE_MAPS_API_URL", "https://maps.googleapis.com/maps/api/geocode/json"
+)
 TOP_K = int(os.getenv("TOP_K", 5))
 NIGHT_WINDOW = os.getenv("NIGHT_WINDOW", "19:00-05:00")
 MAX_HOME_DISTANCE_METERS = float(os.getenv("MAX_HOME_DISTANCE_METERS", 1000))
     
-    
\ No newline at end of file
+    
+# Landmark-only liveness: request a keyframe roughly every N landmark messages
+LIVENESS_KEYFRAME_INTERVAL = int(os.getenv("LIVENESS_KEYFRAME_INTERVAL", 30))
+# Max mean landmark error, relative to eye-corner distance, on keyframe checks
+LIVENESS_LANDMARK_TOLERANCE = float(os.getenv("LIVENESS_LANDMARK_TOLERANCE", 0.08))
+# Max mean error between a keyframe and the landmarks streamed just before it;
+# looser than the above since the head may move between the two frames
+LIVENESS_CONTINUITY_TOLERANCE = float(os.getenv("LIVENESS_CONTINUITY_TOLERANCE", 0.35))
+
+# Google Maps quota: sustained requests per second, burst size and retries.
+# The quota covers the whole project, so QPS and burst are totals that each
+# process divides by GOOGLE_MAPS_PROCESSES, the number of processes sharing
+# the key (workers per pod x pods; defaults to WEB_CONCURRENCY or 1).
+GOOGLE_MAPS_QPS = float(os.getenv("GOOGLE_MAPS_QPS", 50))
+GOOGLE_MAPS_BURST = int(os.getenv("GOOGLE_MAPS_BURST", 50))
+GOOGLE_MAPS_PROCESSES = int(
+    os.getenv("GOOGLE_MAPS_PROCESSES") or os.getenv("WEB_CONCURRENCY") or 1
+)
+GOOGLE_MAPS_MAX_RETRIES = int(os.getenv("GOOGLE_MAPS_MAX_RETRIES", 4))
+
+# Offline reverse geocoding: place table to preload (JSON or CSV) and how close
+# a known place must be to a timeline point to skip the Google call
+LOCAL_GEOCODER_PATH = os.getenv("LOCAL_GEOCODER_PATH", "")
+LOCAL_GEOCODER_MAX_DISTANCE_METERS = float(
+    os.getenv("LOCAL_GEOCODER_MAX_DISTANCE_METERS", 50)
+)
+# Cap on places learned from Google results; the oldest are evicted first.
+# Learned places are written back to LOCAL_GEOCODER_PATH on shutdown. Each
+# worker keeps its own table, so with several workers (or pods sharing the
+# file) the last one to shut down wins and the others' learned places are lost.
+LOCAL_GEOCODER_MAX_LEARNED = int(os.getenv("LOCAL_GEOCODER_MAX_LEARNED", 100_000))
+
+# Resumable liveness sessions: "" keeps them in process memory, a redis:// URL
+# shares them across workers
+LIVENESS_SESSION_STORE_URL = os.getenv("LIVENESS_SESSION_STORE_URL", "")
+LIVENESS_SESSION_TTL_SECONDS = int(os.getenv("LIVENESS_SESSION_TTL_SECONDS", 600))
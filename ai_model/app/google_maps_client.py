@@ -1,16 +1,133 @@
+import random
+import threading
+import time
 import requests
-from .config import GOOGLE_MAPS_API_KEY
+from .config import (
+    GOOGLE_MAPS_API_KEY,
+    GOOGLE_MAPS_API_URL,
+    GOOGLE_MAPS_QPS,
+    GOOGLE_MAPS_BURST,
+    GOOGLE_MAPS_MAX_RETRIES,
+    GOOGLE_MAPS_PROCESSES,
+)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class MapsQuotaExceededError(Exception):
+    """Raised when Maps still reports the quota as exhausted after all retries."""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, holding at most
+    `capacity`. `acquire` blocks until a token is available.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs
+    the function, the others wait and share its result (or exception).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = {"done": threading.Event(), "result": None, "error": None}
+                self.calls[key] = call
+
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = fn()
+            return call["result"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call["done"].set()
+
+
+# Shared across every client in the process; each process gets an equal
+# share of the project-wide quota so all of them together stay under it
+processes = max(1, GOOGLE_MAPS_PROCESSES)
+rate_limiter = TokenBucket(
+    GOOGLE_MAPS_QPS / processes, max(1, GOOGLE_MAPS_BURST // processes)
+)
+in_flight = SingleFlight()
+
 
 class GoogleMapsClient:
     def __init__(self, api_key: str = GOOGLE_MAPS_API_KEY):
         self.api_key = api_key
-        self.reverse_geocode_url = "https://maps.googleapis.com/maps/api/geocode/json"
+        self.reverse_geocode_url = GOOGLE_MAPS_API_URL
+
+    def _get(self, params: dict):
+        """
+        Rate-limited GET with jittered exponential backoff on 429/5xx and
+        on OVER_QUERY_LIMIT responses. Raises MapsQuotaExceededError if the
+        quota is still exhausted after the last retry.
+        """
+        for attempt in range(GOOGLE_MAPS_MAX_RETRIES + 1):
+            rate_limiter.acquire()
+            res = requests.get(self.reverse_geocode_url, params=params, timeout=10)
+            over_quota = res.status_code == 429
+            retryable = over_quota or res.status_code in RETRY_STATUS_CODES
+            if not retryable and res.ok:
+                data = res.json()
+                over_quota = retryable = data.get("status") == "OVER_QUERY_LIMIT"
+            if not retryable:
+                res.raise_for_status()
+                return data
+            if attempt < GOOGLE_MAPS_MAX_RETRIES:
+                time.sleep(random.uniform(0, 0.5 * 2**attempt))
+
+        if over_quota:
+            raise MapsQuotaExceededError(
+                f"Google Maps quota exceeded after {GOOGLE_MAPS_MAX_RETRIES + 1} attempts"
+            )
+        res.raise_for_status()
 
     def geocode(self, address: str):
+        return in_flight.do(("geocode", address), lambda: self._geocode(address))
+
+    def _geocode(self, address: str):
         params = {"address": address, "key": self.api_key}
-        res = requests.get(self.reverse_geocode_url, params=params, timeout=10)
-        res.raise_for_status()
-        data = res.json()
+        data = self._get(params)
         if not data["results"]:
             return None
         result = data["results"][0]
@@ -23,10 +140,13 @@ class GoogleMapsClient:
         }
 
     def reverse_geocode(self, lat: float, lng: float):
+        return in_flight.do(
+            ("reverse_geocode", lat, lng), lambda: self._reverse_geocode(lat, lng)
+        )
+
+    def _reverse_geocode(self, lat: float, lng: float):
         params = {"latlng": f"{lat},{lng}", "key": self.api_key}
-        res = requests.get(self.reverse_geocode_url, params=params, timeout=10)
-        res.raise_for_status()
-        data = res.json()
+        data = self._get(params)
         if not data["results"]:
             return None
         result = data["results"][0]
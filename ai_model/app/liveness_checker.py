@@ -1,9 +1,69 @@
+import math
 import cv2
 import mediapipe as mp
 import numpy as np
 
 mp_face_mesh = mp.solutions.face_mesh
 face_mesh = mp_face_mesh.FaceMesh(static_image_mode=False, max_num_faces=1)
+# Keyframes are sparse, unrelated snapshots, so they must not reuse tracking state
+keyframe_face_mesh = mp_face_mesh.FaceMesh(static_image_mode=True, max_num_faces=1)
+
+# FaceMesh always yields at least this many points (478 with iris refinement)
+FACE_MESH_POINTS = 468
+LEFT_EYE_OUTER = 33
+RIGHT_EYE_OUTER = 263
+
+
+def extract_landmarks(frame, mesh=face_mesh):
+    """
+    Runs FaceMesh on a BGR frame and returns pixel landmarks, or None
+    when no face is found.
+    """
+    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    results = mesh.process(rgb_frame)
+    if not results.multi_face_landmarks:
+        return None
+    h, w = frame.shape[:2]
+    return [(int(lm.x * w), int(lm.y * h)) for lm in results.multi_face_landmarks[0].landmark]
+
+
+def parse_client_landmarks(points, width, height):
+    """
+    Converts normalized [x, y] landmarks computed on the client into the
+    pixel landmarks used by SequentialLiveness. Raises ValueError on
+    anything that is not a list of finite number pairs.
+    """
+    if not isinstance(points, list) or len(points) < FACE_MESH_POINTS:
+        raise ValueError(f"Expected at least {FACE_MESH_POINTS} landmarks")
+    try:
+        w, h = float(width), float(height)
+        coords = [(float(p[0]), float(p[1])) for p in points]
+    except (TypeError, ValueError, IndexError, KeyError):
+        raise ValueError("Landmarks must be [x, y] number pairs")
+    if not (math.isfinite(w) and math.isfinite(h)) or w <= 0 or h <= 0:
+        raise ValueError("Frame width and height must be positive")
+    if not all(math.isfinite(x) and math.isfinite(y) for x, y in coords):
+        raise ValueError("Landmark values must be finite")
+    w, h = int(w), int(h)
+    return [(int(x * w), int(y * h)) for x, y in coords]
+
+
+def landmarks_consistent(client_landmarks, server_landmarks, tolerance):
+    """
+    Checks that client landmarks agree with the ones FaceMesh found on the
+    same keyframe. The mean point error is measured relative to the
+    distance between the outer eye corners, so it does not depend on
+    resolution or how close the face is to the camera.
+    """
+    n = min(len(client_landmarks), len(server_landmarks))
+    client = np.array(client_landmarks[:n], dtype=float)
+    server = np.array(server_landmarks[:n], dtype=float)
+    face_size = np.linalg.norm(server[LEFT_EYE_OUTER] - server[RIGHT_EYE_OUTER])
+    if face_size == 0:
+        return False
+    mean_error = np.mean(np.linalg.norm(client - server, axis=1))
+    return mean_error / face_size <= tolerance
+
 
 # --- Stages for sequential liveness ---
 class LivenessStage:
@@ -52,14 +112,18 @@ class SequentialLiveness:
 
     # ---------------- Main method ----------------
     def process_frame(self, frame):
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = face_mesh.process(rgb_frame)
-        action_completed = False
+        landmarks = extract_landmarks(frame)
+        if landmarks is None:
+            return False  # No face detected
 
-        if not results.multi_face_landmarks:
-            return action_completed  # No face detected
+        return self.process_landmarks(landmarks)
 
-        landmarks = self._get_landmarks(results.multi_face_landmarks[0].landmark, frame.shape)
+    def process_landmarks(self, landmarks):
+        """
+        Advances the stage machine with pixel landmarks, either from
+        server-side FaceMesh or streamed by a client running it on-device.
+        """
+        action_completed = False
 
         # --- State machine ---
         if self.stage == LivenessStage.CALIBRATING:
@@ -82,6 +146,43 @@ class SequentialLiveness:
 
         return action_completed
     
+    # ---------------- Session state ----------------
+    def to_state(self):
+        """
+        Compact, JSON-friendly snapshot of the progress made so far, so a
+        session can be resumed on another worker. Thresholds are config and
+        are not included.
+        """
+        return {
+            "s": self.stage,
+            "n": list(self.prev_nose) if self.prev_nose is not None else None,
+            "h": self.head_movements,
+            "m": self.mouth_movements,
+            "b": self.blinks,
+            "bl": self.blink_detected_last_frame,
+            "c": self.calibration_frames_counter,
+            "e": [round(float(v), 4) for v in self.ear_readings],
+            "r": [round(float(v), 4) for v in self.mar_readings],
+            "be": float(self.baseline_ear),
+            "bm": float(self.baseline_mar),
+        }
+
+    @classmethod
+    def from_state(cls, state, **kwargs):
+        liveness = cls(**kwargs)
+        liveness.stage = state["s"]
+        liveness.prev_nose = tuple(state["n"]) if state["n"] is not None else None
+        liveness.head_movements = state["h"]
+        liveness.mouth_movements = state["m"]
+        liveness.blinks = state["b"]
+        liveness.blink_detected_last_frame = state["bl"]
+        liveness.calibration_frames_counter = state["c"]
+        liveness.ear_readings = state["e"]
+        liveness.mar_readings = state["r"]
+        liveness.baseline_ear = state["be"]
+        liveness.baseline_mar = state["bm"]
+        return liveness
+
     # ---------------- NEW CALIBRATION METHOD ----------------
     def _calibrate(self, landmarks):
         """
@@ -123,10 +224,6 @@ class SequentialLiveness:
             return True # Calibration finished
 
     # ---------------- Helper functions (updated) ----------------
-    def _get_landmarks(self, landmarks, frame_shape):
-        h, w = frame_shape[:2]
-        return [(int(lm.x * w), int(lm.y * h)) for lm in landmarks]
-
     def _euclidean(self, a, b):
         return np.linalg.norm(np.array(a) - np.array(b))
 
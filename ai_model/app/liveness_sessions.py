@@ -0,0 +1,89 @@
+import json
+import secrets
+import threading
+import time
+from typing import Optional
+from .config import LIVENESS_SESSION_STORE_URL, LIVENESS_SESSION_TTL_SECONDS
+
+
+class InMemorySessionStore:
+    """
+    Process-local store. Sessions survive a dropped connection but only on
+    the same worker; use a shared store to resume on any node. Methods are
+    async to match RedisSessionStore but never block.
+    """
+
+    def __init__(self, ttl: int = LIVENESS_SESSION_TTL_SECONDS):
+        self.ttl = ttl
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    async def get(self, token: str) -> Optional[str]:
+        with self.lock:
+            entry = self.sessions.get(token)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self.sessions[token]
+                return None
+            return entry[0]
+
+    async def put(self, token: str, state: str):
+        now = time.monotonic()
+        with self.lock:
+            self.sessions[token] = (state, now + self.ttl)
+            # Drop expired sessions on write so abandoned ones do not pile up
+            if len(self.sessions) % 256 == 0:
+                for key in [k for k, v in self.sessions.items() if v[1] < now]:
+                    del self.sessions[key]
+
+    async def delete(self, token: str):
+        with self.lock:
+            self.sessions.pop(token, None)
+
+
+class RedisSessionStore:
+    """
+    Shared store so a reconnect can land on any worker. Uses the asyncio
+    client so lookups do not block the event loop.
+    """
+
+    def __init__(self, url: str, ttl: int = LIVENESS_SESSION_TTL_SECONDS):
+        import redis.asyncio as redis
+
+        self.ttl = ttl
+        self.client = redis.Redis.from_url(url)
+
+    def _key(self, token: str) -> str:
+        return f"liveness:{token}"
+
+    async def get(self, token: str) -> Optional[str]:
+        state = await self.client.get(self._key(token))
+        return state.decode() if state is not None else None
+
+    async def put(self, token: str, state: str):
+        await self.client.set(self._key(token), state, ex=self.ttl)
+
+    async def delete(self, token: str):
+        await self.client.delete(self._key(token))
+
+
+def create_session_store():
+    if LIVENESS_SESSION_STORE_URL.startswith(("redis://", "rediss://")):
+        return RedisSessionStore(LIVENESS_SESSION_STORE_URL)
+    return InMemorySessionStore()
+
+
+def new_session_token() -> str:
+    return secrets.token_urlsafe(16)
+
+
+def dump_state(state: dict) -> str:
+    return json.dumps(state, separators=(",", ":"))
+
+
+def load_state(raw: str) -> dict:
+    return json.loads(raw)
+
+
+session_store = create_session_store()
@@ -0,0 +1,169 @@
+import csv
+import json
+import os
+import tempfile
+import threading
+from collections import defaultdict, deque
+from math import ceil, cos, floor, radians
+from typing import Dict, Optional
+from .config import (
+    LOCAL_GEOCODER_PATH,
+    LOCAL_GEOCODER_MAX_DISTANCE_METERS,
+    LOCAL_GEOCODER_MAX_LEARNED,
+)
+from .utils import haversine
+
+METERS_PER_DEGREE = 111_320
+
+
+class LocalGeocoder:
+    """
+    Offline reverse geocoder over a table of known places.
+
+    Places are bucketed into a lat/lng grid whose cells are `max_distance`
+    tall, so a lookup only scans the cells around the point instead of the
+    whole table. Google results can be added as they come in ("learned"
+    places), so repeat customers in the same area stop costing a Maps call.
+    Only the newest `max_learned` of those are kept; imported places are
+    never evicted.
+    """
+
+    def __init__(
+        self,
+        max_distance: float = LOCAL_GEOCODER_MAX_DISTANCE_METERS,
+        max_learned: int = LOCAL_GEOCODER_MAX_LEARNED,
+    ):
+        if max_distance <= 0:
+            raise ValueError("LocalGeocoder max_distance must be positive")
+        self.max_distance = max_distance
+        self.max_learned = max_learned
+        self.cell = max_distance / METERS_PER_DEGREE
+        self.grid = defaultdict(list)
+        self.learned = deque()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def _cell_of(self, lat: float, lng: float):
+        return floor(lat / self.cell), floor(lng / self.cell)
+
+    def add(
+        self,
+        lat: float,
+        lng: float,
+        formatted_address: str,
+        place_id: Optional[str] = None,
+        learned: bool = False,
+    ):
+        place = {
+            "lat": float(lat),
+            "lng": float(lng),
+            "formatted_address": formatted_address,
+            "place_id": place_id,
+            "learned": learned,
+        }
+        with self.lock:
+            self.grid[self._cell_of(place["lat"], place["lng"])].append(place)
+            self.size += 1
+            if learned:
+                self.learned.append(place)
+                while len(self.learned) > self.max_learned:
+                    self._remove(self.learned.popleft())
+
+    def _remove(self, place):
+        key = self._cell_of(place["lat"], place["lng"])
+        cell = self.grid[key]
+        cell.remove(place)
+        if not cell:
+            del self.grid[key]
+        self.size -= 1
+
+    def nearest(self, lat: float, lng: float) -> Optional[Dict]:
+        """
+        Returns the closest known place within `max_distance`, in the same
+        shape as GoogleMapsClient.reverse_geocode, or None.
+        """
+        if not self.size:
+            return None
+
+        row, col = self._cell_of(lat, lng)
+        # Longitude degrees shrink towards the poles, so widen the column search
+        col_span = min(ceil(1 / max(cos(radians(lat)), 1e-6)), 180)
+
+        best, best_dist = None, self.max_distance
+        for r in range(row - 1, row + 2):
+            for c in range(col - col_span, col + col_span + 1):
+                for place in self.grid.get((r, c), ()):
+                    dist = haversine(lat, lng, place["lat"], place["lng"])
+                    if dist <= best_dist:
+                        best, best_dist = place, dist
+
+        if best is None:
+            return None
+        return {
+            "formatted_address": best["formatted_address"],
+            "place_id": best["place_id"],
+            "lng": lng,
+            "lat": lat,
+        }
+
+    def load(self, path: str):
+        """
+        Loads places from a JSON list or a CSV with
+        lat,lng,formatted_address[,place_id][,learned].
+        """
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            if path.lower().endswith(".csv"):
+                rows = list(csv.DictReader(f))
+            else:
+                rows = json.load(f)
+        for row in rows:
+            learned = row.get("learned") in (True, "true", "True", "1")
+            self.add(
+                row["lat"],
+                row["lng"],
+                row["formatted_address"],
+                row.get("place_id") or None,
+                learned,
+            )
+
+    def save(self, path: str):
+        """
+        Writes the table back in the format implied by the extension, via a
+        temporary file so a crash mid-write cannot corrupt it. With several
+        processes saving to the same path, the last one to finish wins.
+        """
+        with self.lock:
+            # Learned places go last, oldest first, so a reload keeps eviction order
+            places = [
+                dict(place)
+                for cell in self.grid.values()
+                for place in cell
+                if not place["learned"]
+            ]
+            places += [dict(place) for place in self.learned]
+        # Unique temp name so concurrent writers (other workers or pods on
+        # the same volume) cannot interleave output before the rename
+        with tempfile.NamedTemporaryFile(
+            "w",
+            encoding="utf-8",
+            newline="",
+            dir=os.path.dirname(os.path.abspath(path)),
+            suffix=".tmp",
+            delete=False,
+        ) as f:
+            tmp_path = f.name
+            if path.lower().endswith(".csv"):
+                writer = csv.DictWriter(
+                    f, ["lat", "lng", "formatted_address", "place_id", "learned"]
+                )
+                writer.writeheader()
+                writer.writerows(places)
+            else:
+                json.dump(places, f)
+        os.replace(tmp_path, path)
+
+
+local_geocoder = LocalGeocoder()
+if LOCAL_GEOCODER_PATH and os.path.exists(LOCAL_GEOCODER_PATH):
+    local_geocoder.load(LOCAL_GEOCODER_PATH)
+    print(f"Loaded {local_geocoder.size} places from {LOCAL_GEOCODER_PATH}")
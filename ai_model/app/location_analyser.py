@@ -1,29 +1,34 @@
-import json
+import gzip
+import io
 import re
+import ijson
+import zstandard
 from datetime import datetime, timedelta, time
-from math import radians, cos, sin, asin, sqrt
+from math import isfinite
 from collections import defaultdict
-from typing import Any, List, Optional, Dict
+from typing import Any, Iterator, List, Optional, Dict, Tuple
 from .models import TopLocation, AnalysisResult
 from .google_maps_client import GoogleMapsClient
-from .config import GOOGLE_MAPS_API_KEY
-
-
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371000  # meters
-    dlat = radians(lat2 - lat1)
-    dlon = radians(lon2 - lon1)
-    a = (
-        sin(dlat / 2) ** 2
-        + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
-    )
-    return 2 * R * asin(sqrt(a))
+from .local_geocoder import LocalGeocoder, local_geocoder
+from .config import GOOGLE_MAPS_API_KEY, NIGHT_WINDOW
+from .utils import haversine
 
 
 POINT_RE = re.compile(r"([-+]?\d+\.\d+)[°º]?\s*,\s*([-+]?\d+\.\d+)")
 
 
 def parse_point_str(point: str):
+    # Fast path for the usual "6.5244°, 3.3792°" form; anything else
+    # (prefixes, odd separators) falls back to the regex
+    lat, sep, lng = point.partition(",")
+    if sep:
+        try:
+            lat_f, lng_f = float(lat.strip().rstrip("°º")), float(lng.strip().rstrip("°º"))
+            # float() also accepts "nan"/"inf", which the regex never matches
+            if isfinite(lat_f) and isfinite(lng_f):
+                return lat_f, lng_f
+        except ValueError:
+            pass
     m = POINT_RE.search(point)
     if m:
         return float(m.group(1)), float(m.group(2))
@@ -34,57 +39,157 @@ def parse_iso(dt: str):
     return datetime.fromisoformat(dt.replace("Z", "+00:00"))
 
 
-def in_night_window(dt: datetime):
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def open_timeline(timeline_path: str):
+    """
+    Opens a timeline file as a binary stream, decompressing gzip or zstd
+    on the fly when the magic bytes say so. Nothing is expanded up front.
+    """
+    raw = open(timeline_path, "rb")
+    magic = raw.read(4)
+    raw.seek(0)
+    if magic.startswith(GZIP_MAGIC):
+        raw.close()
+        return gzip.open(timeline_path, "rb")
+    if magic.startswith(ZSTD_MAGIC):
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        return io.BufferedReader(reader)
+    return raw
+
+
+def iter_segments(stream):
+    """
+    Yields timeline segments one at a time from either export layout:
+    {"semanticSegments": [...]} or a bare list of segments.
+    """
+    if not isinstance(stream, io.BufferedReader):
+        stream = io.BufferedReader(stream)
+    head = stream.peek(64).lstrip(b"\xef\xbb\xbf \t\r\n")
+    prefix = "item" if head.startswith(b"[") else "semanticSegments.item"
+    yield from ijson.items(stream, prefix, use_float=True)
+
+
+def parse_window(window: str) -> Tuple[time, time]:
+    """Parses "HH:MM-HH:MM" into (start, end) times."""
+    start, end = window.split("-")
+    return time.fromisoformat(start.strip()), time.fromisoformat(end.strip())
+
+
+NIGHT_START, NIGHT_END = parse_window(NIGHT_WINDOW)
+
+
+def in_night_window(dt: datetime, start: time = NIGHT_START, end: time = NIGHT_END):
     t = dt.time()
-    return t >= time(19, 0) or t < time(5, 0)
+    if start <= end:
+        return start <= t < end
+    # Window wraps past midnight, e.g. 19:00-05:00
+    return t >= start or t < end
 
 
 class LocationAnalyzer:
-    def __init__(self, google_maps_api_key: Optional[str] = GOOGLE_MAPS_API_KEY):
+    def __init__(
+        self,
+        google_maps_api_key: Optional[str] = GOOGLE_MAPS_API_KEY,
+        geocoder: LocalGeocoder = local_geocoder,
+    ):
         self.gmaps = GoogleMapsClient(google_maps_api_key)
+        self.local_geocoder = geocoder
+
+    def reverse_geocode(self, lat: float, lng: float):
+        """Resolves locally when a known place is close enough, else asks Google."""
+        rev = self.local_geocoder.nearest(lat, lng)
+        if rev:
+            return rev
+        rev = self.gmaps.reverse_geocode(lat, lng)
+        if rev:
+            self.local_geocoder.add(
+                lat, lng, rev["formatted_address"], rev.get("place_id"), learned=True
+            )
+        return rev
 
     def analyze(self, timeline_path: str, months: int = 6) -> Dict[str, Any]:
-        with open(timeline_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        for event, payload in self.analyze_stream(timeline_path, months):
+            if event == "result":
+                return payload
+
+    def analyze_stream(
+        self, timeline_path: str, months: int = 6
+    ) -> Iterator[Tuple[str, Any]]:
+        """
+        Same analysis as `analyze`, but yields ("month", (label, TopLocation))
+        as soon as each month is reverse geocoded, then ("result", AnalysisResult).
+        """
+        now = datetime.utcnow()
+        # Only these months are ever evaluated, so segments outside them are
+        # skipped before any of their points are parsed
+        window_keys = set()
+        for i in range(months):
+            month_date = now - timedelta(days=30 * i)
+            window_keys.add((month_date.year, month_date.month))
 
-        segments = data.get("semanticSegments") if isinstance(data, dict) else data
         records = []
+        # Span of nighttime history, tracked over the whole timeline so the
+        # range check does not depend on the analysis window
+        oldest = newest = None
+
+        # Corrupt or truncated uploads should be a 400 like the old json.load
+        # JSONDecodeError, not an unexpected error
+        try:
+            with open_timeline(timeline_path) as f:
+                for seg in iter_segments(f):
+                    start = seg.get("startTime")
+                    if not start:
+                        continue
+                    dt = parse_iso(start)
+                    if not in_night_window(dt):
+                        continue
+
+                    visit = seg.get("visit", {})
+                    loc = visit.get("topCandidate", {}).get("placeLocation")
+                    path = seg.get("timelinePath")
+                    if not loc and not path:
+                        continue
+
+                    if oldest is None or dt < oldest:
+                        oldest = dt
+                    if newest is None or dt > newest:
+                        newest = dt
+
+                    if (dt.year, dt.month) not in window_keys:
+                        continue
+
+                    prob = visit.get("probability") or seg.get("activity", {}).get(
+                        "probability"
+                    )
+                    prob = float(prob) if prob else 0.0
+                    latlngs = []
+
+                    if loc:
+                        if isinstance(loc, str):
+                            latlngs.append(parse_point_str(loc))
+                        elif isinstance(loc, dict) and loc.get("latLng"):
+                            latlngs.append(parse_point_str(loc["latLng"]))
+
+                    if path:
+                        for p in path:
+                            if "point" in p:
+                                try:
+                                    latlngs.append(parse_point_str(p["point"]))
+                                except Exception:
+                                    pass
 
-        for seg in segments:
-            start = seg.get("startTime")
-            prob = seg.get("visit", {}).get("probability") or seg.get(
-                "activity", {}
-            ).get("probability")
-            prob = float(prob) if prob else 0.0
-            latlngs = []
-
-            if seg.get("visit", {}).get("topCandidate", {}).get("placeLocation"):
-                loc = seg["visit"]["topCandidate"]["placeLocation"]
-                if isinstance(loc, str):
-                    latlngs.append(parse_point_str(loc))
-                elif isinstance(loc, dict) and loc.get("latLng"):
-                    latlngs.append(parse_point_str(loc["latLng"]))
-
-            if "timelinePath" in seg:
-                for p in seg["timelinePath"]:
-                    if "point" in p:
-                        try:
-                            latlngs.append(parse_point_str(p["point"]))
-                        except Exception:
-                            pass
-
-            if start:
-                dt = parse_iso(start)
-                if in_night_window(dt):
                     for lat, lng in latlngs:
                         records.append((lat, lng, prob, dt))
+        except (ijson.JSONError, OSError, EOFError, zstandard.ZstdError) as e:
+            raise ValueError(f"Invalid timeline file: {e}") from e
 
-        if not records:
+        if oldest is None:
             raise ValueError("No valid nighttime records found")
 
         # Check timeline range
-        newest = max(r[3] for r in records)
-        oldest = min(r[3] for r in records)
         if int((newest - oldest).days) < 60:  # 2 months
             raise ValueError("Insufficient timeline info (less than 2 months old)")
 
@@ -94,7 +199,6 @@ class LocationAnalyzer:
             key = (dt.year, dt.month)
             monthly_groups[key].append((lat, lng, prob, dt))
 
-        now = datetime.utcnow()
         results_by_month = {}
         top_addresses = []
 
@@ -131,12 +235,14 @@ class LocationAnalyzer:
                 last_seen=max(dts),
             )
 
-            rev = self.gmaps.reverse_geocode(lat, lng)
+            rev = self.reverse_geocode(lat, lng)
             if rev:
                 top_loc.address = rev.get("formatted_address")
 
-            results_by_month[f"{month_date.strftime('%B %Y')}"] = top_loc
+            label = month_date.strftime("%B %Y")
+            results_by_month[label] = top_loc
             top_addresses.append((top_loc.address, len(vals)))
+            yield "month", (label, top_loc)
 
         # Compute confidence score: frequency of the most recurring address
         address_counts = defaultdict(int)
@@ -152,7 +258,7 @@ class LocationAnalyzer:
         else:
             top_confidence_address, confidence_score = None, 0.0
 
-        return AnalysisResult(
+        yield "result", AnalysisResult(
             timeline_months=list(results_by_month.keys()),
             monthly_top_locations={m: results_by_month[m] for m in results_by_month},
             most_likely_home=(
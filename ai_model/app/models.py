@@ -34,7 +34,9 @@ class ProofOfAddressResponse(BaseModel):
 
 class ProofOfAddressRequest(BaseModel):
     bill_url: str = Field(..., description="S3 URL for the utility bill file (PDF)")
-    timeline_url: str = Field(..., description="S3 URL for the timeline file (JSON)")
+    timeline_url: str = Field(
+        ..., description="S3 URL for the timeline file (JSON, optionally gzip or zstd compressed)"
+    )
 
 class LivenessCheckRequest(BaseModel):
     photo_url: str = Field(..., description="S3 URL for the photo file.")
@@ -1,4 +1,5 @@
 import boto3
+from botocore.config import Config
 from urllib.parse import urlparse, unquote_plus
 
 from fastapi import HTTPException
@@ -7,13 +8,17 @@ from app.config import (
     S3_REGION,
     AWS_ACCESS_KEY_ID,
     AWS_SECRET_ACCESS_KEY,
+    S3_ENDPOINT_URL,
 )
 
 s3_client = boto3.client(
     "s3",
     region_name=S3_REGION,
     aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY
+    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+    endpoint_url=S3_ENDPOINT_URL,
+    # Custom endpoints rarely support virtual-hosted bucket names
+    config=Config(s3={"addressing_style": "path"}) if S3_ENDPOINT_URL else None,
 )
 
 def download_s3_file(s3_url: str, local_path: str):
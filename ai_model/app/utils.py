@@ -1,5 +1,18 @@
+from math import radians, cos, sin, asin, sqrt
 from geopy.distance import geodesic
 
 def distance_meters(coord1, coord2):
     """Returns the distance between two lat/lng pairs in meters"""
     return geodesic(coord1, coord2).meters
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two lat/lng points in meters"""
+    R = 6371000  # meters
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = (
+        sin(dlat / 2) ** 2
+        + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    )
+    return 2 * R * asin(sqrt(a))
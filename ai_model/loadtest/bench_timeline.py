@@ -0,0 +1,65 @@
+"""
+Micro-benchmark for timeline ingestion.
+
+Reports points parsed per second with the plain regex and with
+`parse_point_str`, then segments ingested per second by
+`LocationAnalyzer.analyze` on a long synthetic timeline, where the
+analysis window lets most of the history be skipped unparsed.
+
+Usage (from ai_model/):
+    python -m loadtest.bench_timeline --points 500000 --days 1095
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from app.local_geocoder import LocalGeocoder
+from app.location_analyser import POINT_RE, LocationAnalyzer, parse_point_str
+from loadtest import fakes
+
+
+def regex_parse(point: str):
+    m = POINT_RE.search(point)
+    return float(m.group(1)), float(m.group(2))
+
+
+def bench_points(n):
+    points = [f"{6 + i % 1000 / 1e4:.4f}°, {3 + i % 977 / 1e4:.4f}°" for i in range(n)]
+    for name, parse in (("regex", regex_parse), ("parse_point_str", parse_point_str)):
+        started = time.perf_counter()
+        for point in points:
+            parse(point)
+        elapsed = time.perf_counter() - started
+        print(f"{name:<16} {n / elapsed:12,.0f} points/s")
+
+
+def bench_analyze(days, months):
+    timeline = fakes.make_timeline(days)
+    # Reverse geocodes resolve locally, so only ingestion is measured
+    geocoder = LocalGeocoder()
+    geocoder.add(*fakes.HOME, fakes.HOME_ADDRESS)
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        f.write(timeline)
+    try:
+        started = time.perf_counter()
+        LocationAnalyzer(geocoder=geocoder).analyze(f.name, months=months)
+        elapsed = time.perf_counter() - started
+    finally:
+        os.remove(f.name)
+    segments = days * 2
+    print(
+        f"analyze          {segments / elapsed:12,.0f} segments/s "
+        f"({days} days, {len(timeline) / 1e6:.1f} MB, {months}-month window, {elapsed:.2f}s)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--points", type=int, default=500_000)
+    parser.add_argument("--days", type=int, default=3 * 365)
+    parser.add_argument("--months", type=int, default=6)
+    args = parser.parse_args()
+    bench_points(args.points)
+    bench_analyze(args.days, args.months)
@@ -0,0 +1,179 @@
+"""
+Local stand-ins for S3, Google Maps and Document AI used by the load test.
+
+Each fake is a threaded HTTP server with configurable latency, jitter and
+error rate, so the app can be driven hard without touching real services.
+"""
+
+import io
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pypdfium2 as pdfium
+
+HOME = (6.5244, 3.3792)
+HOME_ADDRESS = "12 Allen Avenue, Ikeja, Lagos, Nigeria"
+BILL_TEXT = f"ELECTRICITY BILL\nSERVICE ADDRESS:\n{HOME_ADDRESS}"
+
+
+class Behaviour:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, error_status=503):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    behaviour = Behaviour()
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _delay_or_fail(self):
+        """Sleeps for the configured latency; returns True if it sent an error."""
+        b = self.behaviour
+        delay = b.latency_ms + random.uniform(-b.jitter_ms, b.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        if random.random() < b.error_rate:
+            self._send(b.error_status, b'{"error": "injected failure"}')
+            return True
+        return False
+
+    def _send(self, status, body=b"", content_type="application/json", headers=None, head=False):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _send_json(self, payload):
+        self._send(200, json.dumps(payload).encode())
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+
+class FakeS3Handler(FakeHandler):
+    """Path-style S3: serves `objects[(bucket, key)]` for HEAD and GET."""
+
+    objects = {}
+
+    def _object(self, head):
+        path = urlparse(self.path).path.lstrip("/")
+        bucket, _, key = path.partition("/")
+        body = self.objects.get((bucket, key))
+        if body is None:
+            self._send(404, b"<Error><Code>NoSuchKey</Code></Error>", "application/xml", head=head)
+            return
+        headers = {
+            "ETag": f'"{abs(hash(body))}"',
+            "Last-Modified": formatdate(usegmt=True),
+            "Accept-Ranges": "bytes",
+        }
+        self._send(200, body, "application/octet-stream", headers, head=head)
+
+    def do_HEAD(self):
+        self._object(head=True)
+
+    def do_GET(self):
+        if not self._delay_or_fail():
+            self._object(head=False)
+
+
+class FakeMapsHandler(FakeHandler):
+    """Geocoding API: every address resolves to HOME, every point to HOME_ADDRESS."""
+
+    def do_GET(self):
+        if self._delay_or_fail():
+            return
+        params = parse_qs(urlparse(self.path).query)
+        if "address" in params:
+            lat, lng = HOME
+        else:
+            lat, lng = (float(v) for v in params["latlng"][0].split(","))
+        self._send_json(
+            {
+                "status": "OK",
+                "results": [
+                    {
+                        "formatted_address": HOME_ADDRESS,
+                        "place_id": "fake-place-id",
+                        "geometry": {"location": {"lat": lat, "lng": lng}},
+                    }
+                ],
+            }
+        )
+
+
+class FakeDocAIHandler(FakeHandler):
+    """Document AI REST `:process`: returns BILL_TEXT for any document."""
+
+    def do_POST(self):
+        self._read_body()
+        if self._delay_or_fail():
+            return
+        self._send_json({"document": {"text": BILL_TEXT}})
+
+
+def start_server(handler, behaviour, host="127.0.0.1", port=0, **attrs):
+    """Starts `handler` on a daemon thread and returns the server."""
+    handler_cls = type(handler.__name__, (handler,), {"behaviour": behaviour, **attrs})
+    server = ThreadingHTTPServer((host, port), handler_cls)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def server_url(server):
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def make_timeline(days=120):
+    """Synthetic timeline: one nighttime visit at HOME per day, for `days` days."""
+    now = datetime.now(timezone.utc).replace(hour=22, minute=0, second=0, microsecond=0)
+    point = f"{HOME[0]}°, {HOME[1]}°"
+    segments = []
+    for i in range(days):
+        start = now - timedelta(days=i)
+        segments.append(
+            {
+                "startTime": start.isoformat(),
+                "endTime": (start + timedelta(hours=8)).isoformat(),
+                "visit": {
+                    "probability": 0.9,
+                    "topCandidate": {"placeLocation": {"latLng": point}},
+                },
+            }
+        )
+        segments.append(
+            {
+                "startTime": (start + timedelta(hours=1)).isoformat(),
+                "endTime": (start + timedelta(hours=2)).isoformat(),
+                "timelinePath": [{"point": point, "time": start.isoformat()}] * 10,
+            }
+        )
+    return json.dumps({"semanticSegments": segments}).encode()
+
+
+def make_bill_pdf():
+    """A one-page blank PDF; the fake Document AI supplies the text."""
+    pdf = pdfium.PdfDocument.new()
+    pdf.new_page(612, 792)
+    buffer = io.BytesIO()
+    pdf.save(buffer)
+    pdf.close()
+    return buffer.getvalue()
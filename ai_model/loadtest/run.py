@@ -0,0 +1,291 @@
+"""
+End-to-end load test for the FastAPI app with local service stand-ins.
+
+Starts fake S3, Google Maps and Document AI servers, launches `main.app`
+against them, then drives a mix of `/api/proof-of-address` requests and
+`/ws/liveness` sessions at increasing concurrency. For each level it
+reports throughput, latency percentiles and the server's event-loop lag.
+
+Usage (from ai_model/):
+    pip install -r loadtest/requirements.txt
+    python -m loadtest.run --concurrency 1,8,32,64 --duration 20 \
+        --latency-ms 80 --error-rate 0.01
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+
+import cv2
+import httpx
+import numpy as np
+import websockets
+
+from loadtest import fakes
+
+BUCKET = "loadtest"
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+
+    def summary(self, duration):
+        lat_ms = [v * 1000 for v in self.latencies]
+        return {
+            "ok": len(lat_ms),
+            "errors": self.errors,
+            "rps": len(lat_ms) / duration,
+            "p50": percentile(lat_ms, 50),
+            "p95": percentile(lat_ms, 95),
+            "p99": percentile(lat_ms, 99),
+        }
+
+
+def load_sample(path=None, with_landmarks=False):
+    """
+    The frame to stream, as a JPEG data URL with its size: the given image,
+    or a synthetic 640x480 noise frame. With `with_landmarks`, FaceMesh is
+    run once on the encoded frame so landmark mode can replay landmarks
+    that match it.
+    """
+    if path:
+        frame = cv2.imread(path, cv2.IMREAD_COLOR)
+        if frame is None:
+            raise SystemExit(f"Could not read image: {path}")
+    else:
+        frame = np.random.default_rng(0).integers(0, 255, (480, 640, 3), np.uint8)
+    ok, encoded = cv2.imencode(".jpg", frame)
+    # Use the decoded JPEG so the landmarks match what the server will see
+    frame = cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+    height, width = frame.shape[:2]
+    sample = {
+        "frame": "data:image/jpeg;base64," + base64.b64encode(encoded.tobytes()).decode(),
+        "width": width,
+        "height": height,
+        "landmarks": None,
+    }
+
+    if with_landmarks:
+        import mediapipe as mp
+
+        with mp.solutions.face_mesh.FaceMesh(static_image_mode=True, max_num_faces=1) as mesh:
+            results = mesh.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        if not results.multi_face_landmarks:
+            raise SystemExit("--liveness-mode landmarks needs a --frame with a detectable face")
+        sample["landmarks"] = [
+            [lm.x, lm.y] for lm in results.multi_face_landmarks[0].landmark
+        ]
+    return sample
+
+
+async def proof_of_address_worker(client, base_url, stats, deadline):
+    payload = {
+        "bill_url": f"http://s3.local/{BUCKET}/bill.pdf",
+        "timeline_url": f"http://s3.local/{BUCKET}/timeline.json",
+    }
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        try:
+            res = await client.post(f"{base_url}/api/proof-of-address", json=payload)
+            if res.status_code == 200:
+                stats.latencies.append(time.monotonic() - started)
+            else:
+                stats.errors += 1
+        except httpx.HTTPError:
+            stats.errors += 1
+
+
+async def liveness_worker(ws_url, sample, mode, stats, sessions, deadline):
+    """
+    Opens liveness sessions back to back. Each message round trip is one
+    sample; a session ends when the server finishes or closes it, and a
+    rejected session ({"success": False}) counts as an error.
+    """
+    while time.monotonic() < deadline:
+        try:
+            async with websockets.connect(ws_url, max_size=None) as ws:
+                sessions.append(1)
+                keyframe = True
+                while time.monotonic() < deadline:
+                    if mode == "landmarks":
+                        message = {
+                            "landmarks": sample["landmarks"],
+                            "width": sample["width"],
+                            "height": sample["height"],
+                        }
+                        if keyframe:
+                            message["frame"] = sample["frame"]
+                    else:
+                        message = {"frame": sample["frame"]}
+
+                    started = time.monotonic()
+                    await ws.send(json.dumps(message))
+                    reply = json.loads(await ws.recv())
+                    stats.latencies.append(time.monotonic() - started)
+
+                    if "success" in reply:
+                        if not reply["success"]:
+                            stats.errors += 1
+                        break
+                    keyframe = reply.get("keyframe_requested", False)
+        except (websockets.WebSocketException, OSError):
+            stats.errors += 1
+
+
+async def run_level(base_url, concurrency, args, sample):
+    ws_url = base_url.replace("http", "ws", 1) + "/ws/liveness"
+    # Round up so every level, c=1 included, runs at least one liveness worker
+    ws_workers = min(concurrency, math.ceil(concurrency * args.ws_ratio))
+    http_workers = concurrency - ws_workers
+    poa, liveness, sessions = Stats(), Stats(), []
+
+    async with httpx.AsyncClient(timeout=120) as client:
+        await client.get(f"{base_url}/__loadtest/lag", params={"reset": True})
+        deadline = time.monotonic() + args.duration
+        started = time.monotonic()
+        await asyncio.gather(
+            *[
+                proof_of_address_worker(client, base_url, poa, deadline)
+                for _ in range(http_workers)
+            ],
+            *[
+                liveness_worker(ws_url, sample, args.liveness_mode, liveness, sessions, deadline)
+                for _ in range(ws_workers)
+            ],
+        )
+        elapsed = time.monotonic() - started
+        lag = (await client.get(f"{base_url}/__loadtest/lag")).json()
+
+    return {
+        "concurrency": concurrency,
+        "http_workers": http_workers,
+        "ws_workers": ws_workers,
+        "proof_of_address": poa.summary(elapsed),
+        "liveness_messages": liveness.summary(elapsed),
+        "liveness_sessions": len(sessions),
+        "loop_lag_ms": lag,
+    }
+
+
+def print_report(result):
+    poa, live, lag = (
+        result["proof_of_address"],
+        result["liveness_messages"],
+        result["loop_lag_ms"],
+    )
+    print(
+        f"c={result['concurrency']:<4} "
+        f"poa {poa['rps']:7.1f} rps p50 {poa['p50']:7.1f} p95 {poa['p95']:7.1f} "
+        f"p99 {poa['p99']:7.1f} ms err {poa['errors']:<4} | "
+        f"ws {live['rps']:7.1f} msg/s p50 {live['p50']:6.1f} p99 {live['p99']:6.1f} ms "
+        f"sessions {result['liveness_sessions']:<4} err {live['errors']:<4} | "
+        f"loop lag p99 {lag['p99_ms']:6.1f} max {lag['max_ms']:6.1f} ms",
+        flush=True,
+    )
+
+
+def start_fakes(args):
+    behaviour = lambda status=503: fakes.Behaviour(
+        args.latency_ms, args.jitter_ms, args.error_rate, status
+    )
+    objects = {
+        (BUCKET, "bill.pdf"): fakes.make_bill_pdf(),
+        (BUCKET, "timeline.json"): fakes.make_timeline(args.timeline_days),
+    }
+    s3 = fakes.start_server(fakes.FakeS3Handler, behaviour(), objects=objects)
+    maps = fakes.start_server(fakes.FakeMapsHandler, behaviour(429))
+    docai = fakes.start_server(fakes.FakeDocAIHandler, behaviour())
+    return {
+        "S3_ENDPOINT_URL": fakes.server_url(s3),
+        "S3_REGION": "us-east-1",
+        "AWS_ACCESS_KEY_ID": "loadtest",
+        "AWS_SECRET_ACCESS_KEY": "loadtest",
+        "GOOGLE_MAPS_API_URL": fakes.server_url(maps) + "/maps/api/geocode/json",
+        "GOOGLE_MAPS_API_KEY": "loadtest",
+        "DOC_AI_API_ENDPOINT": fakes.server_url(docai),
+        "GCP_PROJECT_ID": "loadtest",
+        "DOC_AI_OCR_PROCESSOR_ID": "loadtest",
+    }
+
+
+async def wait_until_up(base_url, server, timeout=60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError("App server exited during startup")
+            try:
+                await client.get(base_url + "/")
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError("App server did not start in time")
+
+
+async def main(args):
+    sample = load_sample(args.frame, with_landmarks=args.liveness_mode == "landmarks")
+    env = {**os.environ, **start_fakes(args)}
+    base_url = f"http://127.0.0.1:{args.port}"
+    app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "loadtest.serve", "--port", str(args.port)],
+        cwd=app_dir,
+        env=env,
+        # The app prints per request; keep the report readable by default
+        stdout=None if args.server_logs else subprocess.DEVNULL,
+    )
+    try:
+        await wait_until_up(base_url, server)
+        results = []
+        for concurrency in args.concurrency:
+            result = await run_level(base_url, concurrency, args, sample)
+            print_report(result)
+            results.append(result)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--concurrency",
+        type=lambda v: [int(c) for c in v.split(",")],
+        default=[1, 4, 16, 64],
+        help="comma-separated concurrency levels",
+    )
+    parser.add_argument("--duration", type=float, default=15, help="seconds per level")
+    parser.add_argument(
+        "--ws-ratio", type=float, default=0.5, help="share of workers running liveness sessions"
+    )
+    parser.add_argument("--liveness-mode", choices=["frames", "landmarks"], default="frames")
+    parser.add_argument(
+        "--frame",
+        help="image to stream instead of synthetic noise (required for landmarks mode)",
+    )
+    parser.add_argument("--latency-ms", type=float, default=50, help="fake service latency")
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fake service error rate")
+    parser.add_argument("--timeline-days", type=int, default=120)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", help="also write raw results to this file")
+    parser.add_argument("--server-logs", action="store_true", help="show app stdout")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,54 @@
+"""
+Runs `main.app` for the load test with an event-loop lag probe attached.
+
+Launched by `loadtest.run` as a subprocess, after it has pointed the
+S3/Maps/Document AI settings at the local fakes through the environment.
+"""
+
+import argparse
+import asyncio
+
+import uvicorn
+
+from main import app
+
+PROBE_INTERVAL = 0.05
+lag_samples = []
+
+
+async def probe_loop_lag():
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lag_samples.append(max(0.0, loop.time() - started - PROBE_INTERVAL))
+
+
+async def start_probe():
+    asyncio.get_running_loop().create_task(probe_loop_lag())
+
+
+app.router.on_startup.append(start_probe)
+
+
+@app.get("/__loadtest/lag")
+async def loop_lag(reset: bool = False):
+    samples = sorted(lag_samples)
+    if reset:
+        lag_samples.clear()
+    if not samples:
+        return {"samples": 0, "p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    return {
+        "samples": len(samples),
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+        "max_ms": samples[-1] * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
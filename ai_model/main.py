@@ -5,21 +5,48 @@ from fastapi import (
     WebSocketDisconnect
 )
 from tempfile import NamedTemporaryFile
+from typing import Optional
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from app.bill_extractor import extract_address_from_pdf
-from app.google_maps_client import GoogleMapsClient
-from app.location_analyser import LocationAnalyzer, haversine
-from app.config import MAX_HOME_DISTANCE_METERS
+from app.google_maps_client import GoogleMapsClient, MapsQuotaExceededError
+from app.location_analyser import LocationAnalyzer
+from app.utils import haversine
+from app.local_geocoder import local_geocoder
+from app.config import (
+    MAX_HOME_DISTANCE_METERS,
+    LOCAL_GEOCODER_PATH,
+    LIVENESS_KEYFRAME_INTERVAL,
+    LIVENESS_LANDMARK_TOLERANCE,
+    LIVENESS_CONTINUITY_TOLERANCE,
+)
 import os
+import json
 import base64
+import random
 import cv2
 import numpy as np
-from app.liveness_checker import SequentialLiveness, LivenessStage
+from app.liveness_checker import (
+    SequentialLiveness,
+    LivenessStage,
+    extract_landmarks,
+    keyframe_face_mesh,
+    landmarks_consistent,
+    parse_client_landmarks,
+)
+from app.liveness_sessions import (
+    session_store,
+    new_session_token,
+    dump_state,
+    load_state,
+)
 from app.models import (
     ProofOfAddressResponse,
     ProofOfAddressRequest,
     UtilityAddress,
-    AnalysisResult
+    AnalysisResult,
+    TopLocation,
 )
 from app.s3_client import download_s3_file
 
@@ -34,85 +61,72 @@ app.add_middleware(
 )
 
 
+def save_local_geocoder():
+    # Keep places learned from Google across restarts
+    if LOCAL_GEOCODER_PATH:
+        local_geocoder.save(LOCAL_GEOCODER_PATH)
+        print(f"Saved {local_geocoder.size} places to {LOCAL_GEOCODER_PATH}")
+
+
+app.router.on_shutdown.append(save_local_geocoder)
+
+
 @app.get("/")
 async def hello():
     return {"message": "Hello From Team Trust Loop"}
 
 
-@app.post("/api/proof-of-address")
-async def proof_of_address(request_data: ProofOfAddressRequest):
+def download_to_tmp(url: str, default_suffix: str) -> str:
     # Download Files from S3 to /tmp ---
     # Serverless functions have a writable /tmp directory.
     # We use NamedTemporaryFile to get unique names and proper cleanup.
+    suffix = os.path.splitext(url)[1] or default_suffix
+    with NamedTemporaryFile(delete=False, suffix=suffix, dir="/tmp") as tmp:
+        path = tmp.name
+    download_s3_file(url, path)
+    return path
 
-    bill_extension = os.path.splitext(request_data.bill_url)[1] or ".pdf"
 
-    with NamedTemporaryFile(
-        delete=False, suffix=bill_extension, dir="/tmp"
-    ) as bill_tmp, NamedTemporaryFile(
-        delete=False, suffix=".json", dir="/tmp"
-    ) as timeline_tmp:
+def download_bill(request_data: ProofOfAddressRequest) -> str:
+    return download_to_tmp(request_data.bill_url, ".pdf")
 
-        bill_path = bill_tmp.name
-        timeline_path = timeline_tmp.name
 
-        # Download files from S3
-        download_s3_file(request_data.bill_url, bill_path)
-        download_s3_file(request_data.timeline_url, timeline_path)
+def download_timeline(request_data: ProofOfAddressRequest) -> str:
+    return download_to_tmp(request_data.timeline_url, ".json")
 
-    
-    address_text = extract_address_from_pdf(bill_path)
-    print(f"Extracted address: {address_text}")
 
+def geocode_bill(address_text: str) -> UtilityAddress:
     gmaps = GoogleMapsClient()
-    geo_info = gmaps.geocode(address_text)
+    try:
+        geo_info = gmaps.geocode(address_text)
+    except MapsQuotaExceededError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     if not geo_info:
         raise HTTPException(
             status_code=400, detail="Unable to geocode address from utility bill"
         )
 
-    utility = UtilityAddress(
+    return UtilityAddress(
         address_text=address_text,
         lat=geo_info["lat"],
         lng=geo_info["lng"],
         formatted_address=geo_info["formatted_address"],
         place_id=geo_info["place_id"],
     )
-    
-    
-
-    
-    analyzer = LocationAnalyzer()
-    try:
-        analysis_result: AnalysisResult = analyzer.analyze(timeline_path)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
-    
-    for month, loc in analysis_result.monthly_top_locations.items():
-        if loc.lat and loc.lng:
-            loc.distance_to_bill_meters = round(
-                haversine(loc.lat, loc.lng, utility.lat, utility.lng), 2
-            )
 
-    if (
-        analysis_result.most_likely_home
-        and analysis_result.most_likely_home.lat
-        and analysis_result.most_likely_home.lng
-    ):
-        analysis_result.most_likely_home.distance_to_bill_meters = round(
-            haversine(
-                analysis_result.most_likely_home.lat,
-                analysis_result.most_likely_home.lng,
-                utility.lat,
-                utility.lng,
-            ),
-            2,
+def set_distance_to_bill(loc: Optional[TopLocation], utility: UtilityAddress):
+    if loc and loc.lat and loc.lng:
+        loc.distance_to_bill_meters = round(
+            haversine(loc.lat, loc.lng, utility.lat, utility.lng), 2
         )
 
-    
+
+def build_response(
+    analysis_result: AnalysisResult, utility: UtilityAddress
+) -> ProofOfAddressResponse:
+    set_distance_to_bill(analysis_result.most_likely_home, utility)
+
     confidence = 0.0
     if analysis_result.most_likely_home:
         dist = analysis_result.most_likely_home.distance_to_bill_meters
@@ -123,8 +137,7 @@ async def proof_of_address(request_data: ProofOfAddressRequest):
                 confidence = 0.0
         analysis_result.confidence_score = round(confidence, 2)
 
-    
-    final = ProofOfAddressResponse(
+    return ProofOfAddressResponse(
         utility_address=utility,
         timeline_months=analysis_result.timeline_months,
         monthly_top_locations=analysis_result.monthly_top_locations,
@@ -132,34 +145,247 @@ async def proof_of_address(request_data: ProofOfAddressRequest):
         top_locations=list(analysis_result.monthly_top_locations.values()),
         confidence_score=analysis_result.confidence_score,
     )
+
+
+# Plain def: FastAPI runs it in the threadpool, so the blocking S3, OCR and
+# rate-limited Maps calls do not stall the event loop
+@app.post("/api/proof-of-address")
+def proof_of_address(request_data: ProofOfAddressRequest):
+    bill_path = download_bill(request_data)
+    timeline_path = download_timeline(request_data)
+
+    address_text = extract_address_from_pdf(bill_path)
+    print(f"Extracted address: {address_text}")
+
+    utility = geocode_bill(address_text)
+
+    analyzer = LocationAnalyzer()
+    try:
+        analysis_result: AnalysisResult = analyzer.analyze(timeline_path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except MapsQuotaExceededError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+    for month, loc in analysis_result.monthly_top_locations.items():
+        set_distance_to_bill(loc, utility)
+
+    final = build_response(analysis_result, utility)
     return final.model_dump()
 
 
+# -------------------------------
+# SERVER-SENT EVENTS ENDPOINT
+# -------------------------------
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+@app.post("/api/proof-of-address/stream")
+def proof_of_address_stream(request_data: ProofOfAddressRequest):
+    """
+    Runs the same pipeline as /api/proof-of-address but emits each stage as
+    a Server-Sent Event as soon as it is ready:
+    address -> utility_address -> month (one per month) -> result.
+    Any failure is reported as a final "error" event and ends the stream.
+    """
+
+    def events():
+        try:
+            bill_path = download_bill(request_data)
+
+            address_text = extract_address_from_pdf(bill_path)
+            print(f"Extracted address: {address_text}")
+            if address_text.startswith("Extraction failed"):
+                yield sse_event("error", {"status_code": 400, "detail": address_text})
+                return
+            yield sse_event("address", {"address_text": address_text})
+
+            utility = geocode_bill(address_text)
+            yield sse_event("utility_address", utility)
+
+            # Only fetch the timeline once the bill is known to be usable
+            timeline_path = download_timeline(request_data)
+
+            analyzer = LocationAnalyzer()
+            analysis_result = None
+            for event, payload in analyzer.analyze_stream(timeline_path):
+                if event == "month":
+                    month, loc = payload
+                    set_distance_to_bill(loc, utility)
+                    yield sse_event("month", {"month": month, "location": loc})
+                else:
+                    analysis_result = payload
+
+            yield sse_event("result", build_response(analysis_result, utility))
+
+        except HTTPException as e:
+            yield sse_event("error", {"status_code": e.status_code, "detail": e.detail})
+        except ValueError as e:
+            yield sse_event("error", {"status_code": 400, "detail": str(e)})
+        except MapsQuotaExceededError as e:
+            yield sse_event("error", {"status_code": 503, "detail": str(e)})
+        except Exception as e:
+            yield sse_event(
+                "error",
+                {"status_code": 500, "detail": f"Unexpected error: {str(e)}"},
+            )
+
+    # Sync generators are iterated in a threadpool, so the blocking
+    # S3/OCR/Maps calls do not stall the event loop between events.
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
 # -------------------------------
 # WEBSOCKET STREAM ENDPOINT
 # -------------------------------
+def decode_frame(frame_b64: str):
+    # Frames arrive as data URLs: "data:image/jpeg;base64,...."
+    if not isinstance(frame_b64, str) or "," not in frame_b64:
+        raise ValueError("Frame must be a base64 data URL")
+    try:
+        frame_bytes = base64.b64decode(frame_b64.split(",", 1)[1])
+    except ValueError:
+        raise ValueError("Frame is not valid base64")
+    np_arr = np.frombuffer(frame_bytes, np.uint8)
+    frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR) if np_arr.size else None
+    if frame is None:
+        raise ValueError("Frame could not be decoded as an image")
+    return frame
+
+
 @app.websocket("/ws/liveness")
-async def liveness_ws(websocket: WebSocket):
+async def liveness_ws(websocket: WebSocket, session_token: Optional[str] = None):
+    """
+    Accepts two kinds of messages:
+      - {"frame": <data url>}: server runs FaceMesh on every frame.
+      - {"landmarks": [[x, y], ...], "width": w, "height": h}: normalized
+        landmarks computed on the device. When a response carries
+        "keyframe_requested", the next landmark message must also include
+        the matching "frame". Its size must equal width/height, FaceMesh's
+        landmarks for it must match both the client's and the previous
+        streamed ones, and the stage machine then uses FaceMesh's landmarks.
+    Malformed input ends the session with {"success": False}.
+
+    Every update carries a "session_token". Reconnecting (to any worker
+    sharing the session store) with ?session_token=<token> resumes from
+    the saved stage instead of starting calibration again. The first
+    landmark message after a reconnect is a keyframe, checked against the
+    landmarks and size saved before the disconnect.
+    """
     await websocket.accept()
-    liveness = SequentialLiveness()
+    # Size confirmed by the first keyframe, and the previous streamed
+    # landmarks, used to tie keyframes to the stream around them. Both are
+    # saved with the session so a reconnect cannot swap in a fresh face or
+    # a different resolution at its first keyframe.
+    verified_size = None
+    prev_landmarks = None
+
+    saved = await session_store.get(session_token) if session_token else None
+    if saved:
+        state = load_state(saved)
+        liveness = SequentialLiveness.from_state(state["l"])
+        if state["z"] is not None:
+            verified_size = tuple(state["z"])
+        if state["p"] is not None:
+            prev_landmarks = [tuple(p) for p in state["p"]]
+    else:
+        session_token = new_session_token()
+        liveness = SequentialLiveness()
+    # Spot-check the first landmark message of every connection, resumed
+    # ones included, then sample randomly
+    keyframe_pending = True
+
+    async def fail(message):
+        await session_store.delete(session_token)
+        await websocket.send_json(
+            {"stage": liveness.stage, "success": False, "message": message}
+        )
 
     try:
         while True:
             data = await websocket.receive_json()
             frame_b64 = data.get("frame")
-            if not frame_b64:
-                continue
+            points = data.get("landmarks")
+
+            if points is not None:
+                try:
+                    width, height = data.get("width", 0), data.get("height", 0)
+                    landmarks = parse_client_landmarks(points, width, height)
+                    size = (int(width), int(height))
+                    if keyframe_pending and frame_b64:
+                        frame = decode_frame(frame_b64)
+                        if (frame.shape[1], frame.shape[0]) != size:
+                            raise ValueError("Frame size does not match width/height")
+                except ValueError as e:
+                    await fail(str(e))
+                    break
+
+                if keyframe_pending:
+                    if not frame_b64:
+                        # Hold the stage machine until the keyframe arrives
+                        await websocket.send_json(
+                            {
+                                "stage": liveness.stage,
+                                "action_completed": False,
+                                "keyframe_requested": True,
+                                "session_token": session_token,
+                            }
+                        )
+                        continue
+
+                    # prev_nose and the continuity check are in pixels, so
+                    # the size is fixed for the whole session
+                    if verified_size is not None and size != verified_size:
+                        await fail("Frame size changed since the last keyframe")
+                        break
+
+                    server_landmarks = extract_landmarks(frame, keyframe_face_mesh)
+                    if (
+                        server_landmarks is None
+                        or not landmarks_consistent(
+                            landmarks, server_landmarks, LIVENESS_LANDMARK_TOLERANCE
+                        )
+                        or (
+                            prev_landmarks is not None
+                            and not landmarks_consistent(
+                                prev_landmarks,
+                                server_landmarks,
+                                LIVENESS_CONTINUITY_TOLERANCE,
+                            )
+                        )
+                    ):
+                        await fail("Landmarks do not match keyframe")
+                        break
+                    verified_size = size
+                    # Trust what the server saw, not the client's copy of it
+                    landmarks = server_landmarks
+                    keyframe_pending = False
 
-            # Decode base64 frame
-            frame_bytes = base64.b64decode(frame_b64.split(",")[1])
-            np_arr = np.frombuffer(frame_bytes, np.uint8)
-            frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+                elif size != verified_size:
+                    await fail("Frame size changed since the last keyframe")
+                    break
 
-            # Process frame
-            action_completed = liveness.process_frame(frame)
+                action_completed = liveness.process_landmarks(landmarks)
+                prev_landmarks = landmarks
+                keyframe_pending = random.random() < 1 / LIVENESS_KEYFRAME_INTERVAL
+
+            elif frame_b64:
+                try:
+                    frame = decode_frame(frame_b64)
+                except ValueError as e:
+                    await fail(str(e))
+                    break
+                action_completed = liveness.process_frame(frame)
+
+            else:
+                continue
 
             # Send stage update
             if liveness.stage == LivenessStage.DONE:
+                await session_store.delete(session_token)
                 await websocket.send_json(
                     {
                         "stage": liveness.stage,
@@ -169,10 +395,21 @@ async def liveness_ws(websocket: WebSocket):
                 )
                 break  # Exit the loop
 
-            # If not done, send the normal stage update
-            await websocket.send_json(
-                {"stage": liveness.stage, "action_completed": action_completed}
+            # If not done, save progress and send the normal stage update
+            await session_store.put(
+                session_token,
+                dump_state(
+                    {"l": liveness.to_state(), "z": verified_size, "p": prev_landmarks}
+                ),
             )
+            response = {
+                "stage": liveness.stage,
+                "action_completed": action_completed,
+                "session_token": session_token,
+            }
+            if points is not None:
+                response["keyframe_requested"] = keyframe_pending
+            await websocket.send_json(response)
 
     except WebSocketDisconnect:
         print("Client disconnected")